@@ -4,17 +4,22 @@ Quick PyAMI Demo
 Shows how to load and test an IBIS-AMI model
 """
 
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
 from ctypes import c_double
 from pyibisami.ami.model import AMIModel, AMIModelInitializer
+from pyibisami.common import extract_cursors
+from scipy.fft import rfft, rfftfreq
+from scipy.signal import unit_impulse
 
-def demo_ami_model():
+def demo_ami_model(plot: bool = False):
     """Test the example_tx model"""
     
-    print("=" * 60)
-    print("PyAMI Quick Demo")
-    print("=" * 60)
+    print("\n".join([
+        "=" * 60,
+        "PyAMI Quick Demo",
+        "=" * 60,
+    ]))
     
     # 1. Load the model DLL
     dll_path = r"tests\examples\example_tx_x86_amd64.dll"
@@ -33,23 +38,26 @@ def demo_ami_model():
     nspui = 32  # Samples per UI
     sample_interval = ui / nspui
     
-    print(f"\n2. Simulation Parameters:")
-    print(f"   Bit rate: {bit_rate/1e9:.1f} Gbps")
-    print(f"   Unit Interval: {ui*1e12:.1f} ps")
-    print(f"   Samples per UI: {nspui}")
-    print(f"   Sample interval: {sample_interval*1e12:.2f} ps")
+    print("\n".join([
+        "\n2. Simulation Parameters:",
+        f"   Bit rate: {bit_rate/1e9:.1f} Gbps",
+        f"   Unit Interval: {ui*1e12:.1f} ps",
+        f"   Samples per UI: {nspui}",
+        f"   Sample interval: {sample_interval*1e12:.2f} ps",
+    ]))
     
     # 3. Create impulse input (channel response)
     impulse_len = 200 * nspui  # 200 UI long
-    impulse_response = np.zeros(impulse_len)
-    impulse_response[0] = 1.0  # Ideal impulse at start
+    impulse_response = unit_impulse(impulse_len, dtype=np.float64)  # Ideal impulse at start
     
-    print(f"\n3. Created channel impulse response:")
-    print(f"   Length: {impulse_len} samples ({impulse_len/nspui:.0f} UI)")
-    print(f"   Type: Ideal impulse (delta function)")
+    print("\n".join([
+        "\n3. Created channel impulse response:",
+        f"   Length: {impulse_len} samples ({impulse_len/nspui:.0f} UI)",
+        "   Type: Ideal impulse (delta function)",
+    ]))
     
-    # Convert to ctypes array
-    channel_response = (c_double * impulse_len)(*impulse_response)
+    # View as ctypes array (no copy; ``impulse_response`` must outlive it)
+    channel_response = np.ctypeslib.as_ctypes(impulse_response)
     
     # 4. Set up AMI parameters (using correct parameter names!)
     ami_params = {
@@ -61,12 +69,14 @@ def demo_ami_model():
         }
     }
     
-    print(f"\n4. AMI Parameters:")
-    print(f"   Model: example_tx")
-    print(f"   tx_tap_units: {ami_params['example_tx']['tx_tap_units']} (total current)")
-    print(f"   tx_tap_np1: {ami_params['example_tx']['tx_tap_np1']} (pre-cursor)")
-    print(f"   tx_tap_nm1: {ami_params['example_tx']['tx_tap_nm1']} (post-cursor 1)")
-    print(f"   tx_tap_nm2: {ami_params['example_tx']['tx_tap_nm2']} (post-cursor 2)")
+    print("\n".join([
+        "\n4. AMI Parameters:",
+        "   Model: example_tx",
+        f"   tx_tap_units: {ami_params['example_tx']['tx_tap_units']} (total current)",
+        f"   tx_tap_np1: {ami_params['example_tx']['tx_tap_np1']} (pre-cursor)",
+        f"   tx_tap_nm1: {ami_params['example_tx']['tx_tap_nm1']} (post-cursor 1)",
+        f"   tx_tap_nm2: {ami_params['example_tx']['tx_tap_nm2']} (post-cursor 2)",
+    ]))
     
     # 5. Create initializer object
     print(f"\n5. Creating model initializer...")
@@ -91,8 +101,8 @@ def demo_ami_model():
         model.initialize(initializer)
         print("   ✓ Model initialized!")
         
-        # Get the output impulse response
-        impulse_out = np.array(model._initOut[:impulse_len])
+        # Get the output impulse response (a view of the model's output buffer)
+        impulse_out = np.frombuffer(model._initOut, dtype=np.float64, count=impulse_len)
         
         # Show returned parameters
         if hasattr(model, '_ami_params_out'):
@@ -109,73 +119,91 @@ def demo_ami_model():
         return
     
     # 7. Analyze results
-    print(f"\n7. Results:")
-    main_cursor = np.argmax(np.abs(impulse_out))
-    print(f"   Main cursor at sample: {main_cursor}")
-    print(f"   Main cursor amplitude: {impulse_out[main_cursor]:.4f}")
-    
-    # Find pre-cursor and post-cursor taps
-    precursor = impulse_out[main_cursor - nspui] if main_cursor >= nspui else 0
-    postcursor1 = impulse_out[main_cursor + nspui] if main_cursor + nspui < len(impulse_out) else 0
-    postcursor2 = impulse_out[main_cursor + 2*nspui] if main_cursor + 2*nspui < len(impulse_out) else 0
-    
-    print(f"   Pre-cursor tap: {precursor:.4f}")
-    print(f"   Post-cursor tap 1: {postcursor1:.4f}")
-    print(f"   Post-cursor tap 2: {postcursor2:.4f}")
+    main_cursor, main_amp, precursor, postcursor1, postcursor2 = extract_cursors(impulse_out, nspui)
+    print("\n".join([
+        "\n7. Results:",
+        f"   Main cursor at sample: {main_cursor}",
+        f"   Main cursor amplitude: {main_amp:.4f}",
+        f"   Pre-cursor tap: {precursor:.4f}",
+        f"   Post-cursor tap 1: {postcursor1:.4f}",
+        f"   Post-cursor tap 2: {postcursor2:.4f}",
+    ]))
     
     # 8. Plot results
-    print(f"\n8. Generating plots...")
-    
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
-    
-    # Time domain
-    time_ns = np.arange(len(impulse_out)) * sample_interval * 1e9
-    ax1.plot(time_ns, impulse_out, linewidth=1.5)
-    ax1.axvline(main_cursor * sample_interval * 1e9, color='r', linestyle='--', 
-                alpha=0.5, label='Main cursor')
-    ax1.set_xlabel('Time (ns)')
-    ax1.set_ylabel('Amplitude')
-    ax1.set_title('Transmitter Impulse Response (Time Domain)')
-    ax1.grid(True, alpha=0.3)
-    ax1.legend()
-    ax1.set_xlim([0, 20])  # Show first 20 ns
-    
-    # Frequency domain
-    fft_len = 4096
-    H = np.fft.rfft(impulse_out, fft_len)
-    freq_ghz = np.fft.rfftfreq(fft_len, sample_interval) / 1e9
-    H_dB = 20 * np.log10(np.abs(H) + 1e-12)
-    
-    ax2.plot(freq_ghz, H_dB, linewidth=1.5)
-    ax2.set_xlabel('Frequency (GHz)')
-    ax2.set_ylabel('Magnitude (dB)')
-    ax2.set_title('Transmitter Frequency Response')
-    ax2.grid(True, alpha=0.3)
-    ax2.set_xlim([0, 20])
-    ax2.set_ylim([-40, 10])
-    
-    plt.tight_layout()
-    output_file = 'pyami_demo_output.png'
-    plt.savefig(output_file, dpi=150, bbox_inches='tight')
-    print(f"   ✓ Plot saved: {output_file}")
-    
-    # Don't show plot interactively (may block)
-    # plt.show()
-    
-    print("\n" + "=" * 60)
-    print("Demo Complete!")
-    print("=" * 60)
-    print("\nWhat just happened:")
-    print("1. Loaded an IBIS-AMI transmitter model (DLL)")
-    print("2. Fed it an ideal channel impulse (delta function)")
-    print("3. Model applied transmitter pre-emphasis")
-    print("4. Output shows how Tx shapes the signal:")
-    print("   - Main tap: strongest part of signal")
-    print("   - Pre/post-cursor taps: intentional distortion")
-    print("   - This compensates for channel losses")
-    print("\nThe frequency response shows high-frequency boost")
-    print("(pre-emphasis) to counteract channel attenuation.")
-    print(f"\nCheck the plot: {output_file}")
+    plot_notes = ["\n(Run with --plot to save the time and frequency response plots.)"]
+    if plot:
+        print(f"\n8. Generating plots...")
+        
+        # Deferred, since pyplot is slow to import and only needed here.
+        import matplotlib
+        matplotlib.use('Agg')  # Render straight to file; no GUI backend needed.
+        import matplotlib.pyplot as plt
+        
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), constrained_layout=True)
+        
+        # Time domain
+        time_ns = np.linspace(0.0, (impulse_len - 1) * sample_interval * 1e9, impulse_len)
+        ax1.plot(time_ns, impulse_out, linewidth=1.5)
+        ax1.axvline(main_cursor * sample_interval * 1e9, color='r', linestyle='--', 
+                    alpha=0.5, label='Main cursor')
+        ax1.set_xlabel('Time (ns)')
+        ax1.set_ylabel('Amplitude')
+        ax1.set_title('Transmitter Impulse Response (Time Domain)')
+        ax1.grid(True, alpha=0.3)
+        ax1.legend()
+        ax1.set_xlim([0, 20])  # Show first 20 ns
+        
+        # Frequency domain
+        fft_len = 4096
+        H = rfft(impulse_out, n=fft_len, overwrite_x=False)  # ``impulse_out`` is plotted above.
+        freq_ghz = rfftfreq(fft_len, sample_interval) / 1e9
+        
+        # Convert to dB in place, rather than through a chain of temporaries.
+        H_dB = np.empty_like(H, dtype=np.float64)
+        np.abs(H, out=H_dB)
+        H_dB += 1e-12
+        np.log10(H_dB, out=H_dB)
+        H_dB *= 20.0
+        
+        ax2.plot(freq_ghz, H_dB, linewidth=1.5)
+        ax2.set_xlabel('Frequency (GHz)')
+        ax2.set_ylabel('Magnitude (dB)')
+        ax2.set_title('Transmitter Frequency Response')
+        ax2.grid(True, alpha=0.3)
+        ax2.set_xlim([0, 20])
+        ax2.set_ylim([-40, 10])
+        
+        output_file = 'pyami_demo_output.png'
+        plt.savefig(output_file, dpi=100)
+        print(f"   ✓ Plot saved: {output_file}")
+        plot_notes = [
+            "\nThe frequency response shows high-frequency boost",
+            "(pre-emphasis) to counteract channel attenuation.",
+            f"\nCheck the plot: {output_file}",
+        ]
+        
+        # Don't show plot interactively (may block)
+        # plt.show()
+        
+    summary = [
+        "\n" + "=" * 60,
+        "Demo Complete!",
+        "=" * 60,
+        "\nWhat just happened:",
+        "1. Loaded an IBIS-AMI transmitter model (DLL)",
+        "2. Fed it an ideal channel impulse (delta function)",
+        "3. Model applied transmitter pre-emphasis",
+        "4. Output shows how Tx shapes the signal:",
+        "   - Main tap: strongest part of signal",
+        "   - Pre/post-cursor taps: intentional distortion",
+        "   - This compensates for channel losses",
+    ] + plot_notes
+    print("\n".join(summary))
 
 if __name__ == "__main__":
-    demo_ami_model()
+    parser = argparse.ArgumentParser(description="Quick IBIS-AMI model demo")
+    parser.add_argument(
+        "--plot", action="store_true", help="save the impulse and frequency response plot as a PNG file"
+    )
+    args = parser.parse_args()
+    demo_ami_model(plot=args.plot)
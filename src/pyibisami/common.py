@@ -9,6 +9,7 @@ Copyright (c) 2024 David Banas; all rights reserved World wide.
 """
 
 from typing             import Any, TypeAlias, TypeVar
+import numpy as np
 import numpy.typing as npt  # type: ignore
 from scipy.linalg       import convolution_matrix, lstsq
 
@@ -40,3 +41,24 @@ def deconv_same(y: Rvec, x: Rvec) -> Rvec:
     A = convolution_matrix(x, len(y), "same")
     h, _, _, _ = lstsq(A, y)
     return h
+
+
+def extract_cursors(signal: Rvec, nspui: int) -> tuple[int, float, float, float, float]:
+    """
+    Find the main cursor of an impulse response, and read the cursors one UI before and after it.
+
+    Args:
+        signal: impulse response
+        nspui: number of samples per unit interval
+
+    Returns:
+        (main_idx, main_amp, pre, post1, post2): index and amplitude of the main (largest magnitude) cursor,
+        followed by the pre-cursor and the first two post-cursors; cursors falling off either end read as zero.
+    """
+    n = len(signal)
+    main_idx = int(np.argmax(np.abs(signal)))
+    main_amp = float(signal[main_idx])
+    pre = float(signal[main_idx - nspui]) if main_idx >= nspui else 0.0
+    post1 = float(signal[main_idx + nspui]) if main_idx + nspui < n else 0.0
+    post2 = float(signal[main_idx + 2 * nspui]) if main_idx + 2 * nspui < n else 0.0
+    return main_idx, main_amp, pre, post1, post2
@@ -0,0 +1,20 @@
+import numpy as np
+
+from pyibisami.common import extract_cursors
+
+
+def test_extract_cursors():
+    """Cursors are read one UI either side of the largest magnitude sample."""
+    nspui = 4
+    signal = np.zeros(10 * nspui)
+    signal[[0, nspui, 2 * nspui, 3 * nspui]] = [-0.1, 0.7, -0.2, -0.05]
+    assert extract_cursors(signal, nspui) == (nspui, 0.7, -0.1, -0.2, -0.05)
+
+
+def test_extract_cursors_off_the_ends():
+    """Cursors falling off either end of the signal read as zero."""
+    nspui = 4
+    signal = np.zeros(2 * nspui)
+    signal[0] = -1.0
+    signal[nspui] = 0.5
+    assert extract_cursors(signal, nspui) == (0, -1.0, 0.0, 0.5, 0.0)